@@ -1,5 +1,9 @@
+import hashlib
+import threading
+import time
 from datetime import datetime, timedelta, timezone
-from jose import jwt
+from typing import NamedTuple
+import jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
@@ -9,27 +13,127 @@ from config import settings
 from database import get_db
 from models import User
 
-pwd = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# argon2id for new hashes; bcrypt stays as a verifier so existing users can still log in, and
+# needs_rehash() lets login migrate them.
+pwd = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    default="argon2",
+    deprecated="auto",
+    bcrypt__rounds=settings.bcrypt_rounds,
+    argon2__time_cost=settings.argon2_time_cost,
+    argon2__memory_cost=settings.argon2_memory_cost,
+    argon2__parallelism=settings.argon2_parallelism,
+)
 oauth2 = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+class _TTLCache:
+    """Tiny bounded dict with per-entry expiry; evicts the oldest entry when full."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: dict = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry and time.time() < entry[1]:
+            return entry[0]
+        return None
+
+    def set(self, key, value, expires_at: float):
+        with self._lock:
+            if key not in self._data and len(self._data) >= self.maxsize:
+                # Dicts keep insertion order, so the first key is the oldest
+                self._data.pop(next(iter(self._data)), None)
+            self._data[key] = (value, expires_at)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __contains__(self, key) -> bool:
+        return self.get(key) is not None
+
+# Verified tokens: blake2b(token) -> user_id. Only successful decodes are cached,
+# and we key on a digest so raw tokens never sit in memory longer than the request.
+_token_cache = _TTLCache(settings.token_cache_size)
+
+class CurrentUser(NamedTuple):
+    """
+    What get_current_user hands to routes: a detached, immutable (id, email) snapshot.
+    Not the ORM User - no password_hash, no relationships, safe to share from the cache.
+    """
+    id: int
+    email: str
+
+# user_id -> detached snapshot of the user. Never cache the ORM instance: it's bound to the
+# request's session.
+_user_cache = _TTLCache(settings.user_cache_size)
+
 def hash_password(p: str) -> str:
     return pwd.hash(p)
 
 def verify_password(p: str, h: str) -> bool:
     return pwd.verify(p, h)
 
+def needs_rehash(h: str) -> bool:
+    return pwd.needs_update(h)
+
 def create_token(user_id: int) -> str:
     exp = datetime.now(timezone.utc) + timedelta(minutes=settings.jwt_exp_minutes)
     return jwt.encode({"sub": str(user_id), "exp": exp}, settings.jwt_secret, algorithm=settings.jwt_algo)
 
-def get_current_user(token: str = Depends(oauth2), db: Session = Depends(get_db)) -> User:
+def _token_key(token: str) -> bytes:
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+def decode_token(token: str) -> int:
+    """
+    Return the user id for a valid token.
+
+    The HS256 verify is the bulk of the work on cheap endpoints, and the frontend polls with the
+    same token for its whole lifetime, so verified results are kept until the token's own exp
+    (capped at token_cache_ttl_seconds). Raises on any invalid token.
+    """
+    key = _token_key(token)
+    user_id = _token_cache.get(key)
+    if user_id is not None:
+        return user_id
+
+    payload = jwt.decode(
+        token, settings.jwt_secret, algorithms=[settings.jwt_algo], options={"require": ["exp", "sub"]}
+    )
+    user_id = int(payload["sub"])
+    expires_at = min(float(payload["exp"]), time.time() + settings.token_cache_ttl_seconds)
+    _token_cache.set(key, user_id, expires_at)
+    return user_id
+
+def forget_user(user_id: int) -> None:
+    """Drop a cached user; call after changing or deleting the user row."""
+    _user_cache.pop(user_id)
+
+def get_current_user(token: str = Depends(oauth2), db: Session = Depends(get_db)) -> CurrentUser:
+    """
+    Resolve the bearer token to the current user.
+
+    Returns a detached (id, email) snapshot rather than the ORM row, cached for a few seconds
+    so polling clients don't hit the users table on every request.
+    """
     try:
-        payload = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algo])
-        user_id = int(payload["sub"])
+        user_id = decode_token(token)
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    user = db.get(User, user_id)
-    if not user:
+    user = _user_cache.get(user_id)
+    if user is not None:
+        return user
+
+    row = db.get(User, user_id)
+    if not row:
         raise HTTPException(status_code=401, detail="User not found")
+    user = CurrentUser(id=row.id, email=row.email)
+    _user_cache.set(user_id, user, time.time() + settings.user_cache_ttl_seconds)
+    # End the read transaction now so the connection goes back to the pool instead of idling
+    # in transaction until the request finishes (async routes never use this session again;
+    # sync routes sharing it just start a new transaction)
+    db.close()
     return user
@@ -6,6 +6,7 @@ class Settings(BaseSettings):
     aws_default_region: str = "us-east-1"
     aws_access_key_id: str = "test"
     aws_secret_access_key: str = "test"
+    aws_max_pool_connections: int = 50
 
     s3_bucket: str
     sqs_queue_name: str
@@ -14,4 +15,22 @@ class Settings(BaseSettings):
     jwt_algo: str = "HS256"
     jwt_exp_minutes: int = 60 * 24
 
+    # Password hashing cost (see auth.pwd)
+    bcrypt_rounds: int = 10
+    argon2_time_cost: int = 2
+    argon2_memory_cost: int = 19456  # KiB
+    argon2_parallelism: int = 1
+
+    # Worker threads for sync routes and password hashing (anyio default is 40)
+    thread_pool_size: int = 64
+
+    # Messages per SQS receive (max 10), processed concurrently by the worker
+    worker_batch_size: int = 10
+
+    # In-process cache of verified tokens (see auth.decode_token)
+    token_cache_ttl_seconds: int = 300
+    token_cache_size: int = 10_000
+    user_cache_ttl_seconds: int = 30
+    user_cache_size: int = 10_000
+
 settings = Settings()
@@ -1,10 +1,33 @@
+import orjson
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 from config import settings
 
-engine = create_engine(settings.database_url, pool_pre_ping=True)
+def _json_dumps(obj) -> str:
+    return orjson.dumps(obj).decode()
+
+# JSONB columns are encoded/decoded by the driver; hand it orjson instead of stdlib json
+engine = create_engine(
+    settings.database_url,
+    pool_pre_ping=True,
+    json_serializer=_json_dumps,
+    json_deserializer=orjson.loads,
+)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
+# asyncpg engine for the async routes, so their DB I/O doesn't block the event loop.
+# Same database as DATABASE_URL, only the driver differs.
+async_engine = create_async_engine(
+    make_url(settings.database_url).set(drivername="postgresql+asyncpg"),
+    pool_pre_ping=True,
+    json_serializer=_json_dumps,
+    json_deserializer=orjson.loads,
+)
+# expire_on_commit=False: async sessions can't lazy-load, so keep attributes usable after commit
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 class Base(DeclarativeBase):
     pass
 
@@ -14,3 +37,7 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
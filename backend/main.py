@@ -1,13 +1,22 @@
-import json
-from fastapi import FastAPI, Depends, UploadFile, File, HTTPException
-from sqlalchemy.orm import Session
+import asyncio
+import os
+import traceback
+from contextlib import asynccontextmanager
+import anyio.to_thread
+from fastapi import FastAPI, BackgroundTasks, Depends, UploadFile, File, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, ORJSONResponse
+from sqlalchemy import exists, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, load_only
 from fastapi.security import OAuth2PasswordRequestForm
-from database import Base, engine, get_db
+from database import Base, SessionLocal, engine, get_db, get_async_db
 from models import User, Application, Issue, IssueResolution, RawRow, FinalContact
 from constants import IssueStatus, ApplicationStatus, IssueType
-from auth import hash_password, verify_password, create_token, get_current_user
+from auth import CurrentUser, hash_password, verify_password, needs_rehash, create_token, get_current_user
 from schemas import RegisterIn, TokenOut, ApplicationOut, ResolveIssueIn
-from services.storage import upload_bytes
+from services.storage import upload_fileobj
 from services.queue import publish_job
 from config import settings
 from fastapi.middleware.cors import CORSMiddleware
@@ -15,7 +24,45 @@ from models import Issue, IssueResolution, RawRow, Application
 from constants import IssueStatus
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+ALLOWED_UPLOAD_EXTENSIONS = frozenset({".csv"})
+MAX_UPLOAD_BYTES = 5 * 1024 * 1024
+# Content-Length covers the whole multipart body, so leave room for boundaries and part headers
+MAX_UPLOAD_REQUEST_BYTES = MAX_UPLOAD_BYTES + 64 * 1024
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Sync routes and password hashing share this pool; size it so a burst of logins
+    # doesn't starve the cheap DB-only endpoints.
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.thread_pool_size
+    yield
+
+# orjson for every response: job_detail / list_job_issues return large nested payloads
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
+class RejectOversizedUploads:
+    """
+    Pure ASGI middleware: FastAPI parses the multipart form before the route runs, so reject
+    oversized uploads on the Content-Length header instead of spooling the body first.
+    Every other request passes straight through (no BaseHTTPMiddleware task/streaming wrapper).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] == "/applications":
+            for name, value in scope["headers"]:
+                if name == b"content-length":
+                    if value.isdigit() and int(value) > MAX_UPLOAD_REQUEST_BYTES:
+                        response = JSONResponse(status_code=413, content={"detail": "File too large (max 5MB)"})
+                        await response(scope, receive, send)
+                        return
+                    break
+        await self.app(scope, receive, send)
+
+# Added before CORS so CORS wraps it and the browser can read the 413
+app.add_middleware(RejectOversizedUploads)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173"],
@@ -24,49 +71,95 @@ app.add_middleware(
     allow_headers=["*"],
 )
 @app.post("/auth/register", response_model=TokenOut)
-def register(body: RegisterIn, db: Session = Depends(get_db)):
-    if db.query(User).filter(User.email == body.email).first():
+async def register(body: RegisterIn, db: AsyncSession = Depends(get_async_db)):
+    # The KDF doesn't depend on the DB, so hash in a worker thread while the existence check
+    # is in flight; the SELECT round-trip hides behind the hashing time.
+    email_taken, password_hash = await asyncio.gather(
+        db.scalar(select(exists().where(User.email == body.email))),
+        run_in_threadpool(hash_password, body.password),
+    )
+    if email_taken:
         raise HTTPException(409, "Email already registered")
-    user = User(email=body.email, password_hash=hash_password(body.password))
+    user = User(email=body.email, password_hash=password_hash)
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Lost a race with a concurrent signup; the unique index on email is the real guard
+        await db.rollback()
+        raise HTTPException(409, "Email already registered")
     return {"access_token": create_token(user.id)}
 
 @app.post("/auth/login", response_model=TokenOut)
-def login(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
     # OAuth2PasswordRequestForm uses "username" field; we'll treat it as email
-    user = db.query(User).filter(User.email == form.username).first()
-    if not user or not verify_password(form.password, user.password_hash):
+    user = await db.scalar(select(User).where(User.email == form.username))
+    if not user or not await run_in_threadpool(verify_password, form.password, user.password_hash):
         raise HTTPException(401, "Invalid credentials")
+    # Transparently migrate old bcrypt hashes (or outdated cost params) to the current scheme
+    if needs_rehash(user.password_hash):
+        user.password_hash = await run_in_threadpool(hash_password, form.password)
+        await db.commit()
     return {"access_token": create_token(user.id)}
 
 
+def publish_job_or_fail(application_id: int, file_key: str):
+    """Background task: queue the application, or mark it FAILED so it doesn't sit in PENDING forever."""
+    try:
+        publish_job(application_id, file_key)
+    except Exception as e:
+        print(f"Failed to queue application {application_id}:", str(e))
+        traceback.print_exc()
+        db = SessionLocal()
+        try:
+            application = db.get(Application, application_id)
+            if application and application.status == ApplicationStatus.PENDING:
+                application.status = ApplicationStatus.FAILED
+                application.error_message = f"Could not queue application for processing: {e}"[:5000]
+                db.commit()
+        finally:
+            db.close()
+
 @app.post("/applications", response_model=ApplicationOut)
 async def upload_job(
+    background: BackgroundTasks,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    user: CurrentUser = Depends(get_current_user),
 ):
-    if not file.filename.lower().endswith(".csv"):
+    if os.path.splitext(file.filename or "")[1].lower() not in ALLOWED_UPLOAD_EXTENSIONS:
         raise HTTPException(400, "Only CSV files are supported")
 
-    content = await file.read()
-    if len(content) > 5 * 1024 * 1024:
-        raise HTTPException(400, "File too large (max 5MB)")
+    # The multipart body is already spooled to a temp file; measure it without reading it
+    file.file.seek(0, os.SEEK_END)
+    size = file.file.tell()
+    file.file.seek(0)
+    if size > MAX_UPLOAD_BYTES:
+        raise HTTPException(413, "File too large (max 5MB)")
 
+    # Commit the PENDING row before the S3 PUT: an open transaction would pin a pooled
+    # connection ("idle in transaction") for the whole network transfer
     application = Application(user_id=user.id, status=ApplicationStatus.PENDING, original_filename=file.filename)
     db.add(application)
-    db.commit()
-    db.refresh(application)
+    await db.commit()
 
     file_key = f"uploads/u{user.id}/application-{application.id}.csv"
-    upload_bytes(content, file_key)
+    try:
+        await run_in_threadpool(upload_fileobj, file.file, file_key)
+    except Exception as e:
+        # Don't leave the row PENDING forever (same as publish_job_or_fail)
+        print(f"Failed to store upload for application {application.id}:", str(e))
+        traceback.print_exc()
+        application.status = ApplicationStatus.FAILED
+        application.error_message = f"Could not store uploaded file: {e}"[:5000]
+        await db.commit()
+        raise
 
     application.file_key = file_key
-    db.commit()
+    await db.commit()
 
-    publish_job(application.id, file_key)
+    # The client doesn't need the SQS ack; send it after the response goes out
+    background.add_task(publish_job_or_fail, application.id, file_key)
 
     return ApplicationOut(
         id=application.id,
@@ -80,18 +173,32 @@ async def upload_job(
     )
 
 @app.get("/applications", response_model=list[ApplicationOut])
-def list_applications(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    applications = db.query(Application).filter(Application.user_id == user.id).order_by(Application.id.desc()).all()
-    return [ApplicationOut(
-        id=j.id, status=j.status,
-        total_rows=j.total_rows, valid_rows=j.valid_rows,
-        invalid_rows=j.invalid_rows, conflict_count=j.conflict_count,
-        error_message=j.error_message,
-        original_filename=j.original_filename
-    ) for j in applications]
+def list_applications(db: Session = Depends(get_db), user: CurrentUser = Depends(get_current_user)):
+    # Only load the columns ApplicationOut needs (skips file_key and timestamps)
+    applications = (
+        db.query(Application)
+        .options(load_only(
+            Application.id, Application.status,
+            Application.total_rows, Application.valid_rows,
+            Application.invalid_rows, Application.conflict_count,
+            Application.error_message, Application.original_filename,
+        ))
+        .filter(Application.user_id == user.id)
+        .order_by(Application.id.desc())
+        .all()
+    )
+    # Returning the response directly skips pydantic validation + re-serialization per row;
+    # response_model is kept for the OpenAPI docs.
+    return ORJSONResponse([{
+        "id": j.id, "status": j.status,
+        "total_rows": j.total_rows, "valid_rows": j.valid_rows,
+        "invalid_rows": j.invalid_rows, "conflict_count": j.conflict_count,
+        "error_message": j.error_message,
+        "original_filename": j.original_filename,
+    } for j in applications])
 
 @app.get("/applications/{application_id}")
-def job_detail(application_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+def job_detail(application_id: int, db: Session = Depends(get_db), user: CurrentUser = Depends(get_current_user)):
     application = db.get(Application, application_id)
     if not application or application.user_id != user.id:
         raise HTTPException(404, "application not found")
@@ -109,93 +216,126 @@ def job_detail(application_id: int, db: Session = Depends(get_db), user: User =
             "error_message": application.error_message,
         },
         "issues": [
-            {"id": i.id, "type": i.type, "status": i.status, "key": i.key, "payload": json.loads(i.payload_json)}
+            {"id": i.id, "type": i.type, "status": i.status, "key": i.key, "payload": i.payload_json}
             for i in issues
         ]
     }
     
 @app.get("/applications/{application_id}/issues")
-def list_job_issues(application_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+def list_job_issues(application_id: int, db: Session = Depends(get_db), user: CurrentUser = Depends(get_current_user)):
     application = db.get(Application, application_id)
     if not application or application.user_id != user.id:
         raise HTTPException(404, "application not found")
 
-    issues = db.query(Issue).filter(Issue.application_id == application_id).order_by(Issue.id.asc()).all()
-
-    # build resolution map: issue_id -> chosen_row_id
-    res_rows = db.query(IssueResolution).filter(IssueResolution.issue_id.in_([i.id for i in issues])).all()
-    chosen_by_issue = {}
-    for r in res_rows:
-        data = json.loads(r.resolution_json)
-        chosen_by_issue[r.issue_id] = data.get("chosen_row_id")
+    # Issues with their (optional) resolution in one round-trip; only the columns the
+    # response uses, and just chosen_row_id out of the resolution JSONB
+    chosen_id_col = IssueResolution.resolution_json["chosen_row_id"].as_integer()
+    rows = (
+        db.query(Issue.id, Issue.type, Issue.status, Issue.key, Issue.payload_json, chosen_id_col)
+        .outerjoin(IssueResolution, IssueResolution.issue_id == Issue.id)
+        .filter(Issue.application_id == application_id)
+        .order_by(Issue.id.asc())
+        .all()
+    )
 
     out = []
-    for i in issues:
+    for issue_id, issue_type, status, key, payload, chosen_row_id in rows:
+        resolution = None
+        if status == IssueStatus.RESOLVED:
+            resolution = {"chosen_row_id": chosen_row_id}
         out.append({
-            "id": i.id,
-            "type": i.type,
-            "status": i.status,
-            "key": i.key,
-            "payload": json.loads(i.payload_json),
-            "resolution": {
-                "chosen_row_id": chosen_by_issue.get(i.id)
-            } if i.status == IssueStatus.RESOLVED else None
+            "id": issue_id,
+            "type": issue_type,
+            "status": status,
+            "key": key,
+            "payload": payload,
+            "resolution": resolution,
         })
     return out
 
     
 @app.post("/applications/{application_id}/finalize")
-def finalize_job(application_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+def finalize_job(application_id: int, db: Session = Depends(get_db), user: CurrentUser = Depends(get_current_user)):
     application = db.get(Application, application_id)
     if not application or application.user_id != user.id:
         raise HTTPException(404, "application not found")
 
-    open_issues = db.query(Issue).filter(Issue.application_id == application_id, Issue.status == IssueStatus.OPEN).count()
-    if open_issues > 0:
+    has_open = db.query(
+        db.query(Issue).filter(Issue.application_id == application_id, Issue.status == IssueStatus.OPEN).exists()
+    ).scalar()
+    if has_open:
         raise HTTPException(409, "Cannot finalize: unresolved issues remain")
 
-    # Clear any previous final contacts (idempotent finalize)
+    # Clear any previous final contacts (idempotent finalize). Same transaction as the inserts
+    # and status update below: one commit, and a failure can't leave the contacts half-rebuilt.
     db.query(FinalContact).filter(FinalContact.application_id == application_id).delete()
-    db.commit()
 
-    # Map resolved issues: email -> chosen_row_id
-    resolutions = (
-        db.query(Issue, IssueResolution)
+    # Map resolved duplicate issues: email -> chosen_row_id, read straight out of the JSONB
+    chosen_id_col = IssueResolution.resolution_json["chosen_row_id"].as_integer()
+    chosen_by_email = dict(
+        db.query(Issue.key, chosen_id_col)
         .join(IssueResolution, IssueResolution.issue_id == Issue.id)
-        .filter(Issue.application_id == application_id)
+        .filter(
+            Issue.application_id == application_id,
+            Issue.type == IssueType.DUPLICATE_EMAIL,
+            chosen_id_col.isnot(None),
+        )
+        .all()
+    )
+
+    # Contact fields come out of the JSONB as text (->>), so no row document is decoded here
+    fields = (
+        RawRow.data_json["first_name"].astext,
+        RawRow.data_json["last_name"].astext,
+        RawRow.data_json["company"].astext,
+    )
+
+    # First valid row per email; Postgres does the grouping (DISTINCT ON) so we only pull
+    # one row per contact instead of every valid row
+    first_rows = (
+        db.query(RawRow.normalized_email, *fields)
+        .filter(
+            RawRow.application_id == application_id,
+            RawRow.is_valid == True,  # noqa: E712
+            RawRow.normalized_email.isnot(None),
+        )
+        .distinct(RawRow.normalized_email)
+        .order_by(RawRow.normalized_email, RawRow.id)
         .all()
     )
-    chosen_by_email = {}
-    for issue, res in resolutions:
-        if issue.type == IssueType.DUPLICATE_EMAIL:
-            data = json.loads(res.resolution_json)
-            chosen_by_email[issue.key] = int(data["chosen_row_id"])
-
-    # Build contacts from valid rows
-    rows = db.query(RawRow).filter(RawRow.application_id == application_id, RawRow.is_valid == True).all()  # noqa: E712
-    by_email = {}
-    for r in rows:
-        if r.normalized_email:
-            by_email.setdefault(r.normalized_email, []).append(r)
-
-    for email, rlist in by_email.items():
+
+    # Fields of the rows chosen for conflict emails: one IN query
+    chosen_data = {}
+    if chosen_by_email:
+        chosen_data = {
+            row_id: values
+            for row_id, *values in db.query(RawRow.id, *fields)
+            .filter(RawRow.application_id == application_id, RawRow.id.in_(list(chosen_by_email.values())))
+        }
+
+    contacts = []
+    for email, *values in first_rows:
         # If there was a conflict and we have a chosen row, use it
         if email in chosen_by_email:
-            chosen_row = db.get(RawRow, chosen_by_email[email])
-            if not chosen_row:
+            values = chosen_data.get(chosen_by_email[email])
+            if values is None:
                 continue
-            data = json.loads(chosen_row.data_json)
-        else:
-            # No issue for this email: pick first valid row
-            data = json.loads(rlist[0].data_json)
-
-        db.add(FinalContact(
-            application_id=application_id,
-            email=email,
-            first_name=data.get("first_name"),
-            last_name=data.get("last_name"),
-            company=data.get("company"),
-        ))
+        # else: no issue for this email, keep the first valid row
+
+        first_name, last_name, company = values
+        contacts.append({
+            "application_id": application_id,
+            "email": email,
+            "first_name": first_name,
+            "last_name": last_name,
+            "company": company,
+        })
+
+    # One executemany for all contacts (psycopg pipelines the rows) instead of one ORM object each.
+    # render_nulls: skipped contacts often have NULL name/company fields, and without it the ORM
+    # bulk path starts a new INSERT every time the set of NULL columns changes.
+    if contacts:
+        db.execute(insert(FinalContact).execution_options(render_nulls=True), contacts)
 
     application.status = ApplicationStatus.COMPLETED
     db.commit()
@@ -207,7 +347,7 @@ def resolve_issue(
     issue_id: int,
     body: ResolveIssueIn,
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
 ):
     issue = db.get(Issue, issue_id)
     if not issue:
@@ -235,9 +375,9 @@ def resolve_issue(
         payload = {"action": "skip", "row_id": body.row_id}
         existing = db.query(IssueResolution).filter(IssueResolution.issue_id == issue.id).one_or_none()
         if existing:
-            existing.resolution_json = json.dumps(payload)
+            existing.resolution_json = payload
         else:
-            db.add(IssueResolution(issue_id=issue.id, resolution_json=json.dumps(payload)))
+            db.add(IssueResolution(issue_id=issue.id, resolution_json=payload))
         issue.status = IssueStatus.RESOLVED
         db.commit()
         return {"ok": True, "issue_id": issue.id, "status": issue.status}
@@ -253,7 +393,7 @@ def resolve_issue(
         
         # Validate and update the row with corrected data
         # Only allow updating: email, first_name, last_name, company
-        current_data = json.loads(row.data_json)
+        current_data = dict(row.data_json)
         
         # Update allowed fields
         if "email" in body.updated_data:
@@ -271,7 +411,7 @@ def resolve_issue(
         normalized_email = normalize_email(updated_email) if updated_email else None
         
         # Update the row
-        row.data_json = json.dumps(current_data)
+        row.data_json = current_data
         row.normalized_email = normalized_email if normalized_email and is_valid_email_format(normalized_email) else None
         row.is_valid = True
         db.commit()
@@ -280,9 +420,9 @@ def resolve_issue(
         payload = {"action": "edit", "row_id": body.row_id, "updated_data": body.updated_data}
         existing = db.query(IssueResolution).filter(IssueResolution.issue_id == issue.id).one_or_none()
         if existing:
-            existing.resolution_json = json.dumps(payload)
+            existing.resolution_json = payload
         else:
-            db.add(IssueResolution(issue_id=issue.id, resolution_json=json.dumps(payload)))
+            db.add(IssueResolution(issue_id=issue.id, resolution_json=payload))
         issue.status = IssueStatus.RESOLVED
         db.commit()
         return {"ok": True, "issue_id": issue.id, "status": issue.status}
@@ -301,9 +441,9 @@ def resolve_issue(
         payload = {"action": body.action, "chosen_row_id": body.chosen_row_id}
         existing = db.query(IssueResolution).filter(IssueResolution.issue_id == issue.id).one_or_none()
         if existing:
-            existing.resolution_json = json.dumps(payload)
+            existing.resolution_json = payload
         else:
-            db.add(IssueResolution(issue_id=issue.id, resolution_json=json.dumps(payload)))
+            db.add(IssueResolution(issue_id=issue.id, resolution_json=payload))
         issue.status = IssueStatus.RESOLVED
         db.commit()
         return {"ok": True, "issue_id": issue.id, "status": issue.status}
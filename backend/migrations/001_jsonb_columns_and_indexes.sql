@@ -0,0 +1,28 @@
+-- Brings a database created before the JSONB / index changes up to the current models.
+-- Fresh databases don't need this: Base.metadata.create_all builds the current schema,
+-- but it never alters tables that already exist.
+--
+--   psql "$DATABASE_URL" -f migrations/001_jsonb_columns_and_indexes.sql
+--   docker compose exec -T db psql -U user -d ingestion_db < backend/migrations/001_jsonb_columns_and_indexes.sql
+--
+-- Safe to re-run. The ALTERs rewrite their tables and hold an exclusive lock while they do,
+-- so stop the API and worker first.
+
+BEGIN;
+
+-- JSON columns: Text -> JSONB. Reads of Text columns come back as str, which breaks
+-- resolve_issue and the ->> queries in finalize / list issues.
+ALTER TABLE raw_rows ALTER COLUMN data_json TYPE JSONB USING data_json::jsonb;
+ALTER TABLE raw_rows ALTER COLUMN validation_errors_json TYPE JSONB USING validation_errors_json::jsonb;
+ALTER TABLE issues ALTER COLUMN payload_json TYPE JSONB USING payload_json::jsonb;
+ALTER TABLE issue_resolutions ALTER COLUMN resolution_json TYPE JSONB USING resolution_json::jsonb;
+
+-- Composite indexes (models.RawRow / models.Issue __table_args__)
+CREATE INDEX IF NOT EXISTS ix_rawrow_app_valid_email ON raw_rows (application_id, is_valid, normalized_email);
+CREATE INDEX IF NOT EXISTS ix_rawrow_app_email ON raw_rows (application_id, normalized_email);
+CREATE INDEX IF NOT EXISTS ix_issues_app_status ON issues (application_id, status);
+
+-- Replaced by ix_rawrow_app_email: email lookups are always scoped to an application
+DROP INDEX IF EXISTS ix_raw_rows_normalized_email;
+
+COMMIT;
@@ -1,7 +1,8 @@
 from sqlalchemy import (
     Column, Integer, String, ForeignKey, DateTime, Boolean, Text,
-    UniqueConstraint, func
+    UniqueConstraint, Index, func
 )
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from database import Base
 from constants import ApplicationStatus, IssueType, IssueStatus
@@ -36,11 +37,18 @@ class RawRow(Base):
     id = Column(Integer, primary_key=True)
     application_id = Column(Integer, ForeignKey("applications.id"), nullable=False, index=True)
     row_number = Column(Integer, nullable=False)
-    data_json = Column(Text, nullable=False)
-    normalized_email = Column(String(255), nullable=True, index=True)
+    data_json = Column(JSONB, nullable=False)
+    normalized_email = Column(String(255), nullable=True)
 
     is_valid = Column(Boolean, nullable=False, default=True)
-    validation_errors_json = Column(Text, nullable=True)
+    validation_errors_json = Column(JSONB(none_as_null=True), nullable=True)
+
+    __table_args__ = (
+        # finalize / auto-finalize scan valid rows of an application grouped by email
+        Index("ix_rawrow_app_valid_email", "application_id", "is_valid", "normalized_email"),
+        # email lookups are always scoped to one application; replaces the global email index
+        Index("ix_rawrow_app_email", "application_id", "normalized_email"),
+    )
 
 class Issue(Base):
     __tablename__ = "issues"
@@ -50,20 +58,22 @@ class Issue(Base):
     status = Column(String(32), nullable=False, default=IssueStatus.OPEN)
 
     key = Column(String(255), nullable=False)    
-    payload_json = Column(Text, nullable=False)   
+    payload_json = Column(JSONB, nullable=False)   
 
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
 
     __table_args__ = (
         UniqueConstraint("application_id", "type", "key", name="uq_issue_job_type_key"),
+        # open-issue counts before finalize / after processing
+        Index("ix_issues_app_status", "application_id", "status"),
     )
 
 class IssueResolution(Base):
     __tablename__ = "issue_resolutions"
     id = Column(Integer, primary_key=True)
     issue_id = Column(Integer, ForeignKey("issues.id"), nullable=False, unique=True)
-    resolution_json = Column(Text, nullable=False)
+    resolution_json = Column(JSONB, nullable=False)
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
 
 class FinalContact(Base):
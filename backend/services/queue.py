@@ -1,17 +1,28 @@
-import json
+import orjson
+from functools import lru_cache
 import boto3
+from botocore.config import Config
 from config import settings
 
+@lru_cache(maxsize=None)
 def sqs_client():
+    # One client per process so the worker's poll/delete loop reuses its connections
     return boto3.client(
         "sqs",
         endpoint_url=settings.aws_endpoint_url,
         region_name=settings.aws_default_region,
         aws_access_key_id=settings.aws_access_key_id,
         aws_secret_access_key=settings.aws_secret_access_key,
+        config=Config(
+            max_pool_connections=settings.aws_max_pool_connections,
+            retries={"max_attempts": 3, "mode": "adaptive"},
+            tcp_keepalive=True,
+        ),
     )
 
+@lru_cache(maxsize=None)
 def get_queue_url() -> str:
+    # The URL never changes for a queue name; resolve it once instead of a GetQueueUrl per call
     client = sqs_client()
     return client.get_queue_url(QueueName=settings.sqs_queue_name)["QueueUrl"]
 
@@ -20,9 +31,37 @@ def publish_job(application_id: int, file_key: str) -> None:
     queue_url = get_queue_url()
     client.send_message(
         QueueUrl=queue_url,
-        MessageBody=json.dumps({"application_id": application_id, "file_key": file_key}),
+        MessageBody=orjson.dumps({"application_id": application_id, "file_key": file_key}).decode(),
     )
 
+# SendMessageBatch accepts at most 10 entries per call
+_SEND_BATCH_SIZE = 10
+
+def publish_jobs_batch(jobs: list[tuple[int, str]]) -> None:
+    """Publish several (application_id, file_key) jobs, ten per SendMessageBatch call."""
+    client = sqs_client()
+    queue_url = get_queue_url()
+    failed_ids: list[int] = []
+    for start in range(0, len(jobs), _SEND_BATCH_SIZE):
+        chunk = jobs[start:start + _SEND_BATCH_SIZE]
+        resp = client.send_message_batch(
+            QueueUrl=queue_url,
+            Entries=[
+                {
+                    "Id": str(i),
+                    "MessageBody": orjson.dumps({"application_id": application_id, "file_key": file_key}).decode(),
+                }
+                for i, (application_id, file_key) in enumerate(chunk)
+            ],
+        )
+        # Entry ids are positions within this chunk
+        failed_ids.extend(chunk[int(f["Id"])][0] for f in resp.get("Failed", []))
+
+    # Partial failures don't raise from boto3; surface them like a failed send_message would,
+    # after the remaining chunks have still been sent
+    if failed_ids:
+        raise RuntimeError(f"failed to publish jobs for applications {failed_ids}")
+
 def poll_messages(max_messages: int = 1, wait_seconds: int = 10):
     client = sqs_client()
     queue_url = get_queue_url()
@@ -34,6 +73,13 @@ def poll_messages(max_messages: int = 1, wait_seconds: int = 10):
     )
     return resp.get("Messages", []), queue_url
 
-def delete_message(queue_url: str, receipt_handle: str) -> None:
+def delete_message_batch(queue_url: str, receipt_handles: list[str]) -> list[dict]:
+    """Delete up to ten received messages in one call; returns the entries SQS failed to delete."""
+    if not receipt_handles:
+        return []
     client = sqs_client()
-    client.delete_message(QueueUrl=queue_url, ReceiptHandle=receipt_handle)
+    resp = client.delete_message_batch(
+        QueueUrl=queue_url,
+        Entries=[{"Id": str(i), "ReceiptHandle": r} for i, r in enumerate(receipt_handles)],
+    )
+    return resp.get("Failed", [])
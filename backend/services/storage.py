@@ -1,21 +1,39 @@
+from typing import BinaryIO
+from functools import lru_cache
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from config import settings
 
+@lru_cache(maxsize=None)
 def s3_client():
+    # Built once per process: client construction loads the service model and each new
+    # client opens fresh TLS connections. boto3 clients are thread-safe.
     return boto3.client(
         "s3",
         endpoint_url=settings.aws_endpoint_url,
         region_name=settings.aws_default_region,
         aws_access_key_id=settings.aws_access_key_id,
         aws_secret_access_key=settings.aws_secret_access_key,
+        config=Config(
+            max_pool_connections=settings.aws_max_pool_connections,
+            retries={"max_attempts": 3, "mode": "adaptive"},
+            tcp_keepalive=True,
+        ),
     )
 
-def upload_bytes(file_bytes: bytes, key: str) -> str:
+# Uploads are capped at a few MB, below the 8MB multipart threshold: every upload is a single
+# streamed PUT, so don't spin up a transfer thread pool per call.
+_upload_config = TransferConfig(use_threads=False)
+
+def upload_fileobj(fileobj: BinaryIO, key: str) -> str:
+    """Stream a file-like object to S3 (multipart for large bodies) without reading it into memory."""
     client = s3_client()
-    client.put_object(Bucket=settings.s3_bucket, Key=key, Body=file_bytes)
+    client.upload_fileobj(fileobj, settings.s3_bucket, key, Config=_upload_config)
     return key
 
-def download_bytes(key: str) -> bytes:
+def download_stream(key: str):
+    """Return the object's StreamingBody so callers can read it incrementally."""
     client = s3_client()
     obj = client.get_object(Bucket=settings.s3_bucket, Key=key)
-    return obj["Body"].read()
+    return obj["Body"]
@@ -0,0 +1,71 @@
+import pytest
+
+import auth
+from auth import create_token, decode_token, hash_password, verify_password, needs_rehash
+
+
+def test_decode_token_roundtrip():
+    assert decode_token(create_token(42)) == 42
+
+
+def test_decode_token_uses_cache(monkeypatch):
+    token = create_token(7)
+    decode_token(token)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("jwt.decode should not be called on a cache hit")
+
+    monkeypatch.setattr(auth.jwt, "decode", fail)
+    assert decode_token(token) == 7
+
+
+def test_decode_token_does_not_cache_failures():
+    with pytest.raises(Exception):
+        decode_token("not-a-token")
+    assert auth._token_key("not-a-token") not in auth._token_cache
+
+
+def test_hash_password_uses_argon2():
+    h = hash_password("correct horse")
+    assert h.startswith("$argon2id$")
+    assert verify_password("correct horse", h)
+    assert not verify_password("wrong horse", h)
+    assert not needs_rehash(h)
+
+
+def test_legacy_bcrypt_hash_verifies_and_needs_rehash():
+    h = auth.pwd.hash("correct horse", scheme="bcrypt")
+    assert verify_password("correct horse", h)
+    assert needs_rehash(h)
+
+
+class _FakeDB:
+    def __init__(self, user):
+        self.user = user
+        self.calls = 0
+        self.closed = False
+
+    def get(self, model, user_id):
+        self.calls += 1
+        return self.user if self.user and self.user.id == user_id else None
+
+    def close(self):
+        self.closed = True
+
+
+def test_get_current_user_caches_detached_user():
+    row = auth.User(id=99, email="cached@example.com", password_hash="x")
+    db = _FakeDB(row)
+    token = create_token(99)
+
+    first = auth.get_current_user(token, db)
+    second = auth.get_current_user(token, db)
+    assert first == auth.CurrentUser(id=99, email="cached@example.com")
+    assert second is first
+    assert db.calls == 1
+    # the lookup's transaction is ended right away, not held for the rest of the request
+    assert db.closed
+
+    auth.forget_user(99)
+    auth.get_current_user(token, db)
+    assert db.calls == 2
@@ -0,0 +1,53 @@
+import io
+
+import pytest
+
+from worker import open_csv_text, csv_rows, _cell
+
+
+def parse(data: bytes):
+    columns, rows = csv_rows(open_csv_text(io.BytesIO(data)))
+    return columns, list(rows)
+
+
+def test_bom_is_stripped_from_first_header():
+    columns, rows = parse("\ufeffemail,first_name\na@b.com,Jo\n".encode())
+    assert columns == {"email": 0, "first_name": 1}
+    assert rows == [["a@b.com", "Jo"]]
+
+
+def test_blank_lines_are_skipped():
+    _, rows = parse(b"email\n\na@b.com\n\r\n\nc@d.com\n")
+    assert rows == [["a@b.com"], ["c@d.com"]]
+
+
+@pytest.mark.parametrize("sep", ["\u2028", "\u0085", "\x0b", "\x0c", "\x1c", "\x1d", "\x1e"])
+def test_unicode_line_separators_stay_inside_the_field(sep):
+    _, rows = parse(f"email,first_name,last_name,company\na@b.com,Jo{sep}hn,Doe,Acme\n".encode())
+    assert rows == [["a@b.com", f"Jo{sep}hn", "Doe", "Acme"]]
+
+
+def test_quoted_commas_and_newlines():
+    _, rows = parse(b'email,company\r\na@b.com,"Acme, Inc"\r\nc@d.com,"Multi\nline"\r\n')
+    assert rows == [["a@b.com", "Acme, Inc"], ["c@d.com", "Multi\nline"]]
+
+
+def test_short_rows_read_as_missing():
+    columns, rows = parse(b"email,first_name,company\na@b.com\n")
+    assert _cell(rows[0], columns["email"]) == "a@b.com"
+    assert _cell(rows[0], columns["company"]) is None
+    assert _cell(rows[0], columns.get("last_name")) is None
+
+
+def test_invalid_utf8_is_replaced():
+    _, rows = parse(b"email,first_name\na@b.com,J\xffo\n")
+    assert rows == [["a@b.com", "J\ufffdo"]]
+
+
+@pytest.mark.parametrize("data, message", [
+    (b"", "no headers"),
+    (b"name,company\nJo,Acme\n", "'email' column"),
+])
+def test_bad_header_raises(data, message):
+    with pytest.raises(ValueError, match=message):
+        parse(data)
@@ -24,6 +24,7 @@ def test_is_valid_email_format_valid(email):
 @pytest.mark.parametrize("email", [
     "", "notanemail", "john@", "@example.com", "john@example", "john@example,com",
     "john@example.com;other@example.com",
+    "john@@example.com", "a" * 250 + "@example.com",
 ])
 def test_is_valid_email_format_invalid(email):
     assert is_valid_email_format(email) is False
@@ -0,0 +1,81 @@
+import orjson
+import pytest
+
+from services import queue
+
+
+class _FakeSQS:
+    """Records batch calls; fails the entry ids listed in fail_ids (per call)."""
+
+    def __init__(self, fail_ids=()):
+        self.fail_ids = set(fail_ids)
+        self.calls = []
+
+    def send_message_batch(self, QueueUrl, Entries):
+        self.calls.append((QueueUrl, Entries))
+        failed = [{"Id": e["Id"], "Code": "InternalError", "SenderFault": False}
+                  for e in Entries if e["Id"] in self.fail_ids]
+        return {"Successful": [], "Failed": failed}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        self.calls.append((QueueUrl, Entries))
+        failed = [{"Id": e["Id"], "Code": "ReceiptHandleIsInvalid", "SenderFault": True}
+                  for e in Entries if e["Id"] in self.fail_ids]
+        return {"Successful": [], "Failed": failed}
+
+
+@pytest.fixture
+def fake_sqs(monkeypatch):
+    def install(**kwargs):
+        client = _FakeSQS(**kwargs)
+        monkeypatch.setattr(queue, "sqs_client", lambda: client)
+        monkeypatch.setattr(queue, "get_queue_url", lambda: "http://queue")
+        return client
+    return install
+
+
+def test_publish_jobs_batch_sends_ten_per_call(fake_sqs):
+    client = fake_sqs()
+    jobs = [(i, f"uploads/{i}.csv") for i in range(23)]
+
+    queue.publish_jobs_batch(jobs)
+
+    assert [len(entries) for _, entries in client.calls] == [10, 10, 3]
+    assert all(url == "http://queue" for url, _ in client.calls)
+    bodies = [orjson.loads(e["MessageBody"]) for _, entries in client.calls for e in entries]
+    assert bodies == [{"application_id": i, "file_key": k} for i, k in jobs]
+
+
+def test_publish_jobs_batch_raises_with_failed_application_ids(fake_sqs):
+    # Ids are per call, so "3" fails the 4th job of every chunk: applications 103 and 113
+    client = fake_sqs(fail_ids={"3"})
+    jobs = [(100 + i, f"uploads/{i}.csv") for i in range(15)]
+
+    with pytest.raises(RuntimeError, match=r"\[103, 113\]"):
+        queue.publish_jobs_batch(jobs)
+    # A failure in the first chunk doesn't stop the rest from being sent
+    assert len(client.calls) == 2
+
+
+def test_publish_jobs_batch_empty_is_noop(fake_sqs):
+    client = fake_sqs()
+    queue.publish_jobs_batch([])
+    assert client.calls == []
+
+
+def test_delete_message_batch_sends_receipts_and_returns_failures(fake_sqs):
+    client = fake_sqs(fail_ids={"1"})
+
+    failed = queue.delete_message_batch("http://queue", ["r0", "r1", "r2"])
+
+    assert client.calls == [(
+        "http://queue",
+        [{"Id": "0", "ReceiptHandle": "r0"}, {"Id": "1", "ReceiptHandle": "r1"}, {"Id": "2", "ReceiptHandle": "r2"}],
+    )]
+    assert [f["Id"] for f in failed] == ["1"]
+
+
+def test_delete_message_batch_empty_skips_the_call(fake_sqs):
+    client = fake_sqs()
+    assert queue.delete_message_batch("http://queue", []) == []
+    assert client.calls == []
@@ -1,31 +1,46 @@
 # backend/worker.py
 import csv
 import io
-import json
 import re
 import time
 import traceback
-from typing import Dict, List, Tuple, Set
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, DefaultDict, Dict, Iterator, List, Set, TextIO, Tuple
 
+import orjson
+
+from sqlalchemy import func, insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 
+from config import settings
 from database import SessionLocal
 from models import Application, RawRow, Issue, IssueResolution, FinalContact
 from constants import ApplicationStatus, IssueType, IssueStatus, ValidationError
-from services.storage import download_bytes
-from services.queue import poll_messages, delete_message
+from services.storage import download_stream
+from services.queue import poll_messages, delete_message_batch
+
+
+# Compiled once: these run for every CSV row. Stdlib re is deliberate: the email pattern has no
+# nested quantifiers, so it can't backtrack catastrophically, and for short strings re2's
+# bindings measured roughly 10x slower per call than re.
+_EMAIL_COMMENT_RE = re.compile(r'\s*\(.*?\)\s*$')
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
 
 
 def normalize_email(email: str | None) -> str | None:
     """Normalize email: strip whitespace, lowercase, remove comments"""
     if not email:
         return None
-    e = email.strip().lower()
+    e = email.lower()
     
     # Remove comments like "email@example.com (work)" -> "email@example.com"
-    e = re.sub(r'\s*\(.*?\)\s*$', '', e)
+    # (most rows have none, so skip the regex unless there's a paren)
+    if '(' in e:
+        e = _EMAIL_COMMENT_RE.sub('', e.strip())
     
-    # Remove extra whitespace
+    # Strip and remove extra whitespace
     e = ' '.join(e.split())
     
     return e if e else None
@@ -35,25 +50,10 @@ def is_valid_email_format(email: str) -> bool:
     """Basic email format validation"""
     if not email or len(email) > 254:
         return False
-    
-    # Check for multiple emails (semicolon or comma separated)
-    if ';' in email or ',' in email:
-        return False
-    
-    # Basic format check: must have @ and domain with .
-    if '@' not in email:
-        return False
-    
-    local, domain = email.rsplit('@', 1)
-    if not local or not domain:
-        return False
-    
-    if '.' not in domain:
-        return False
-    
-    # Basic regex pattern for email validation
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return bool(re.match(pattern, email))
+
+    # The pattern alone covers the old separate checks: a single @ with a non-empty local
+    # part, a dotted domain, and no ';' / ',' (multiple emails), so no split per row
+    return _EMAIL_RE.match(email) is not None
 
 
 def clean_field(value: str | None) -> str | None:
@@ -61,28 +61,57 @@ def clean_field(value: str | None) -> str | None:
     if not value:
         return None
     
-    # Strip whitespace
-    cleaned = value.strip()
-    
-    # Remove extra internal whitespace
-    cleaned = ' '.join(cleaned.split())
+    # Strip and remove extra internal whitespace in one pass (split() drops the ends)
+    cleaned = ' '.join(value.split())
     
     return cleaned if cleaned else None
 
 
-def identity_signature(data: dict) -> Tuple[str, str, str]:
+def _cell(row: List[str], index: int | None) -> str | None:
+    """Value at a header position; None if the column is absent or the row is short."""
+    if index is None or index >= len(row):
+        return None
+    return row[index]
+
+
+def open_csv_text(body: BinaryIO) -> io.TextIOWrapper:
     """
-    What defines a 'different identity' for same email.
-    Returns normalized (first_name, last_name, company) tuple.
+    Text view of an uploaded CSV body (botocore's StreamingBody is an IOBase).
+    newline="" leaves record splitting to csv, so only \\n / \\r end a row, not U+2028 and
+    the other separators str.splitlines breaks on. utf-8-sig drops a leading BOM.
+    """
+    return io.TextIOWrapper(body, encoding="utf-8-sig", errors="replace", newline="")
+
+
+def csv_rows(f: TextIO) -> Tuple[Dict[str, int], Iterator[List[str]]]:
+    """
+    Header column positions and the data rows of a CSV text stream.
+    Raises ValueError if the header is missing or has no 'email' column.
     """
-    fn = (data.get("first_name") or "").strip().lower()
-    ln = (data.get("last_name") or "").strip().lower()
-    co = (data.get("company") or "").strip().lower()
-    return (fn, ln, co)
+    # Plain csv.reader (no dict per row); columns are looked up by header position
+    reader = csv.reader(f)
+    fieldnames = next(reader, None)
+    # Validate we have the expected columns
+    if not fieldnames:
+        raise ValueError("CSV file has no headers")
 
+    # Check for email column (required)
+    if 'email' not in fieldnames:
+        raise ValueError("CSV file must have an 'email' column")
 
-def safe_json(obj) -> str:
-    return json.dumps(obj, ensure_ascii=False)
+    # Last occurrence wins for repeated headers, as with DictReader
+    columns = {name: i for i, name in enumerate(fieldnames)}
+    # Blank lines are skipped without counting, as DictReader did
+    return columns, (r for r in reader if r)
+
+
+def identity_signature(first_name: str | None, last_name: str | None, company: str | None) -> Tuple[str, str, str]:
+    """
+    What defines a 'different identity' for same email.
+    Takes the fields as returned by clean_field (already stripped, or None) and
+    returns the normalized (first_name, last_name, company) tuple.
+    """
+    return ((first_name or "").lower(), (last_name or "").lower(), (company or "").lower())
 
 
 def set_job_failed(db: Session, application: Application, message: str):
@@ -91,66 +120,35 @@ def set_job_failed(db: Session, application: Application, message: str):
     db.commit()
 
 
-def upsert_duplicate_issue(
-    db: Session,
+def duplicate_issue_row(
     application_id: int,
     email: str,
     candidate_rows: List[dict],
-):
-    """
-    Idempotent insert for duplicate email conflicts.
-    
-    Design Decision: Using 'upsert' pattern instead of insert-only because:
-    1. User might re-upload the same file (we should update, not crash)
-    2. Worker might process same application twice (queue visibility timeout)
-    3. Allows updating candidate list if CSV changes
-    
-    Note: We DON'T auto-reopen resolved issues - if user already chose a candidate
-    and re-uploads, their choice persists (better UX than forcing re-review).
-    
-    Database: Unique constraint on (application_id, type, key) prevents duplicate issues.
-    """
-    existing = (
-        db.query(Issue)
-        .filter(Issue.application_id == application_id, Issue.type == IssueType.DUPLICATE_EMAIL, Issue.key == email)
-        .one_or_none()
-    )
+) -> dict:
+    """Issue values for a duplicate email conflict (written by upsert_issues)."""
     payload = {
         "email": email,
         "candidates": candidate_rows,  # each should include row_id + row_number + fields
     }
-
-    if existing:
-        # Only update payload; don't reopen automatically if already resolved
-        existing.payload_json = safe_json(payload)
-        db.add(existing)
-        db.commit()
-        return existing
-
-    issue = Issue(
-        application_id=application_id,
-        type=IssueType.DUPLICATE_EMAIL,
-        status=IssueStatus.OPEN,
-        key=email,
-        payload_json=safe_json(payload),
-    )
-    db.add(issue)
-    db.commit()
-    db.refresh(issue)
-    return issue
+    return {
+        "application_id": application_id,
+        "type": IssueType.DUPLICATE_EMAIL,
+        "status": IssueStatus.OPEN,
+        "key": email,
+        "payload_json": payload,
+    }
 
 
-def create_row_issue(
-    db: Session,
+def row_issue_row(
     application_id: int,
     issue_type: str,
     row_id: int,
     row_number: int,
     row_data: dict,
     reason: str,
-):
+) -> dict:
     """
-    Create an issue for a single row with a validation problem.
+    Issue values for a single row with a validation problem.
     
     Evolution: Initially, I auto-rejected rows with missing/invalid emails.
     Changed to create issues instead because:
@@ -161,35 +159,53 @@ def create_row_issue(
     Trade-off: More issues for user to review, but better transparency.
     Key is based on row_id to make it unique per row.
     """
-    key = f"row_{row_id}"
-    
-    existing = (
-        db.query(Issue)
-        .filter(Issue.application_id == application_id, Issue.type == issue_type, Issue.key == key)
-        .one_or_none()
-    )
-    
     payload = {
         "row_id": row_id,
         "row_number": row_number,
         "data": row_data,
         "reason": reason,
     }
+    return {
+        "application_id": application_id,
+        "type": issue_type,
+        "status": IssueStatus.OPEN,
+        "key": f"row_{row_id}",
+        "payload_json": payload,
+    }
 
-    if existing:
-        existing.payload_json = safe_json(payload)
-        db.add(existing)
-        return existing
-
-    issue = Issue(
-        application_id=application_id,
-        type=issue_type,
-        status=IssueStatus.OPEN,
-        key=key,
-        payload_json=safe_json(payload),
+
+def upsert_issues(db: Session, issue_rows: List[dict]) -> None:
+    """
+    Idempotent bulk insert for all issues of a job.
+    
+    Design Decision: Using 'upsert' pattern instead of insert-only because:
+    1. User might re-upload the same file (we should update, not crash)
+    2. Worker might process same application twice (queue visibility timeout)
+    3. Allows updating candidate list if CSV changes
+    
+    Note: We DON'T auto-reopen resolved issues - on conflict only the payload is
+    replaced, so a choice the user already made persists (better UX than forcing re-review).
+    
+    Database: Unique constraint on (application_id, type, key) prevents duplicate issues;
+    it is also the ON CONFLICT target, so the batch is a single executemany of upserts
+    instead of a SELECT + INSERT/UPDATE (+ commit) per issue.
+    """
+    if not issue_rows:
+        return
+    # render_nulls: keep every row the same shape so a NULL in some future nullable column
+    # can't split the ORM bulk insert into one statement per NULL pattern
+    stmt = pg_insert(Issue).execution_options(render_nulls=True)
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_issue_job_type_key",
+        # onupdate doesn't fire for ON CONFLICT, so bump updated_at explicitly
+        set_={"payload_json": stmt.excluded.payload_json, "updated_at": func.now()},
     )
-    db.add(issue)
-    return issue
+    # Without RETURNING, SQLAlchemy doesn't page this into multi-row VALUES for psycopg 3
+    # (use_insertmanyvalues_wo_returning=False): it hands the single-row upsert and all
+    # parameter sets to cursor.executemany, which psycopg pipelines in one round-trip batch.
+    # No statement ever carries more than one row's parameters, so the bind-param limit
+    # doesn't apply.
+    db.execute(stmt, issue_rows)
 
 
 def auto_finalize_if_no_issues(db: Session, application: Application):
@@ -198,30 +214,45 @@ def auto_finalize_if_no_issues(db: Session, application: Application):
     - For each email with multiple valid rows but same identity, pick first
     - For conflict emails, there should be an Issue -> so we don't auto-finalize those
     """
-    open_issues = db.query(Issue).filter(Issue.application_id == application.id, Issue.status == IssueStatus.OPEN).count()
-    if open_issues > 0:
+    has_open = db.query(
+        db.query(Issue).filter(Issue.application_id == application.id, Issue.status == IssueStatus.OPEN).exists()
+    ).scalar()
+    if has_open:
         return False
 
-    # Build contacts from valid rows
-    rows = db.query(RawRow).filter(RawRow.application_id == application.id, RawRow.is_valid == True).all()  # noqa: E712
-    # group by normalized_email
-    by_email: Dict[str, List[RawRow]] = {}
-    for r in rows:
-        if not r.normalized_email:
-            continue
-        by_email.setdefault(r.normalized_email, []).append(r)
-
-    for email, rlist in by_email.items():
-        # pick first row's data_json
-        data = json.loads(rlist[0].data_json)
-        fc = FinalContact(
-            application_id=application.id,
-            email=email,
-            first_name=data.get("first_name"),
-            last_name=data.get("last_name"),
-            company=data.get("company"),
+    # First valid row per email (lowest id), with the contact fields pulled out of the JSONB
+    # as text by Postgres instead of decoding every row's document here
+    rows = (
+        db.query(
+            RawRow.normalized_email,
+            RawRow.data_json["first_name"].astext,
+            RawRow.data_json["last_name"].astext,
+            RawRow.data_json["company"].astext,
         )
-        db.add(fc)
+        .filter(
+            RawRow.application_id == application.id,
+            RawRow.is_valid == True,  # noqa: E712
+            RawRow.normalized_email.isnot(None),
+        )
+        .distinct(RawRow.normalized_email)
+        .order_by(RawRow.normalized_email, RawRow.id)
+        .all()
+    )
+
+    contacts = [
+        {
+            "application_id": application.id,
+            "email": email,
+            "first_name": first_name,
+            "last_name": last_name,
+            "company": company,
+        }
+        for email, first_name, last_name, company in rows
+    ]
+
+    # render_nulls keeps contacts with NULL fields in the same executemany (see finalize_job)
+    if contacts:
+        db.execute(insert(FinalContact).execution_options(render_nulls=True), contacts)
 
     application.status = ApplicationStatus.COMPLETED
     db.commit()
@@ -254,84 +285,113 @@ def process_job(db: Session, application_id: int, file_key: str):
     db.commit()
 
     try:
-        file_bytes = download_bytes(file_key)
-        text = file_bytes.decode("utf-8-sig", errors="replace")
-        f = io.StringIO(text)
-
-        # Try to read CSV - catch parse errors
-        try:
-            reader = csv.DictReader(f)
-            # Validate we have the expected columns
-            if not reader.fieldnames:
-                raise ValueError("CSV file has no headers")
-            
-            # Check for email column (required)
-            if 'email' not in reader.fieldnames:
-                raise ValueError("CSV file must have an 'email' column")
-                
-        except csv.Error as e:
-            set_job_failed(db, application, f"CSV parse error: {str(e)}")
-            return
-        except Exception as e:
-            set_job_failed(db, application, f"File read error: {str(e)}")
-            return
-
-        total = 0
-        valid = 0
-
-        # Track identity signatures for duplicates
-        email_to_sigs: Dict[str, Set[Tuple[str, str, str]]] = {}
-        email_to_row_ids: Dict[str, List[int]] = {}
-
-        for row_number, row in enumerate(reader, start=2):  # start=2 (header is line 1)
-            total += 1
+        # Decode incrementally off the S3 body; closing the wrapper releases the connection,
+        # including on the early returns below
+        with open_csv_text(download_stream(file_key)) as f:
+            # Try to read CSV - catch parse errors
+            try:
+                columns, rows = csv_rows(f)
+            except csv.Error as e:
+                set_job_failed(db, application, f"CSV parse error: {str(e)}")
+                return
+            except Exception as e:
+                set_job_failed(db, application, f"File read error: {str(e)}")
+                return
+
+            email_col = columns["email"]
+            first_name_col = columns.get("first_name")
+            last_name_col = columns.get("last_name")
+            company_col = columns.get("company")
+
+            total = 0
+            valid = 0
+            invalid = 0
+
+            # Track identity signatures for duplicates
+            email_to_sigs: DefaultDict[str, Set[Tuple[str, str, str]]] = defaultdict(set)
+            # Positions in raw_dicts / row_ids per email (dense ints, known before the insert);
+            # conflict candidates are built from them, so nothing is re-read from the DB
+            email_to_indices: DefaultDict[str, List[int]] = defaultdict(list)
+            # Row and duplicate issues, upserted together once the scan is done
+            issue_rows: List[dict] = []
+
+            # Parse every row first, then insert them all in one executemany round-trip.
+            # Row ids are only needed afterwards (issues, duplicate tracking).
+            raw_dicts: List[dict] = []
+            parsed_rows: List[Tuple[int, int, dict, bool]] = []  # (index into raw_dicts, row_number, row_data, email_ok)
+
+            for row_number, row in enumerate(rows, start=2):  # start=2 (header is line 1)
+                total += 1
             
-            # Handle malformed rows
-            if row is None or not isinstance(row, dict):
-                invalid += 1
-                raw = RawRow(
-                    application_id=application_id,
-                    row_number=row_number,
-                    data_json=safe_json({}),
-                    normalized_email=None,
-                    is_valid=False,
-                    validation_errors_json=safe_json([ValidationError.MALFORMED_ROW]),
-                )
-                db.add(raw)
-                db.flush()
-                continue
+                # Handle malformed rows
+                if not isinstance(row, list):
+                    invalid += 1
+                    raw_dicts.append({
+                        "application_id": application_id,
+                        "row_number": row_number,
+                        "data_json": {},
+                        "normalized_email": None,
+                        "is_valid": False,
+                        "validation_errors_json": [ValidationError.MALFORMED_ROW],
+                    })
+                    continue
 
-            # Extract and clean email
-            raw_email = row.get("email", "").strip() if row.get("email") else None
-            email = normalize_email(raw_email)
+                # Extract and clean email (normalize_email strips)
+                email = normalize_email(_cell(row, email_col))
             
-            # Clean other fields
-            first_name = clean_field(row.get("first_name"))
-            last_name = clean_field(row.get("last_name"))
-            company = clean_field(row.get("company"))
+                # Clean other fields
+                first_name = clean_field(_cell(row, first_name_col))
+                last_name = clean_field(_cell(row, last_name_col))
+                company = clean_field(_cell(row, company_col))
             
-            # Store the row data
-            row_data = {
-                "email": email,
-                "first_name": first_name,
-                "last_name": last_name,
-                "company": company,
-            }
-
-            # For now, consider all rows as valid and store them
-            # We'll create issues for problems that need user review
-            raw = RawRow(
-                application_id=application_id,
-                row_number=row_number,
-                data_json=safe_json(row_data),
-                normalized_email=email if email and is_valid_email_format(email) else None,
-                is_valid=True,  # Consider valid, but may have issues
-                validation_errors_json=None,
-            )
-            db.add(raw)
-            db.flush()   # assigns raw.id without committing
+                # Store the row data
+                row_data = {
+                    "email": email,
+                    "first_name": first_name,
+                    "last_name": last_name,
+                    "company": company,
+                }
+
+                # For now, consider all rows as valid and store them
+                # We'll create issues for problems that need user review
+                email_ok = bool(email) and is_valid_email_format(email)
+
+                # Track valid rows with proper email for duplicate detection
+                if email_ok:
+                    sig = identity_signature(first_name, last_name, company)
+                    email_to_sigs[email].add(sig)
+                    email_to_indices[email].append(len(raw_dicts))
+
+                parsed_rows.append((len(raw_dicts), row_number, row_data, email_ok))
+                raw_dicts.append({
+                    "application_id": application_id,
+                    "row_number": row_number,
+                    "data_json": row_data,
+                    "normalized_email": email if email_ok else None,
+                    "is_valid": True,  # Consider valid, but may have issues
+                    "validation_errors_json": None,
+                })
             
-            valid += 1
+                valid += 1
+
+        # Bulk INSERT ... RETURNING for the whole file (paged by insertmanyvalues); ids come back
+        # in parameter order. render_nulls: the ORM bulk path otherwise drops None-valued keys and
+        # starts a new batch whenever that set changes - e.g. on every valid/invalid email switch.
+        row_ids: List[int] = []
+        if raw_dicts:
+            row_ids = db.scalars(
+                insert(RawRow)
+                .returning(RawRow.id, sort_by_parameter_order=True)
+                .execution_options(render_nulls=True),
+                raw_dicts,
+            ).all()
+
+        for index, row_number, row_data, email_ok in parsed_rows:
+            raw_id = row_ids[index]
+            email = row_data["email"]
+            first_name = row_data["first_name"]
+            last_name = row_data["last_name"]
+            company = row_data["company"]
 
             # Check for issues that require user review
             issues_for_row = []
@@ -340,7 +400,7 @@ def process_job(db: Session, application_id: int, file_key: str):
             if not email:
                 issues_for_row.append((IssueType.MISSING_EMAIL, "Email field is missing or empty"))
             # Issue 2: Invalid email format
-            elif not is_valid_email_format(email):
+            elif not email_ok:
                 issues_for_row.append((IssueType.INVALID_EMAIL_FORMAT, f"Invalid email format: {email}"))
             
             # Issue 3: Missing first name
@@ -355,23 +415,16 @@ def process_job(db: Session, application_id: int, file_key: str):
             if not company:
                 issues_for_row.append((IssueType.MISSING_COMPANY, "Company is missing"))
             
-            # Create issues for this row
+            # Queue issues for this row; all issues are written in one upsert below
             for issue_type, reason in issues_for_row:
-                create_row_issue(
-                    db=db,
+                issue_rows.append(row_issue_row(
                     application_id=application_id,
                     issue_type=issue_type,
-                    row_id=raw.id,
+                    row_id=raw_id,
                     row_number=row_number,
                     row_data=row_data,
                     reason=reason,
-                )
-
-            # Track valid rows with proper email for duplicate detection
-            if email and is_valid_email_format(email):
-                sig = identity_signature(row_data)
-                email_to_sigs.setdefault(email, set()).add(sig)
-                email_to_row_ids.setdefault(email, []).append(raw.id)
+                ))
 
         # Create issues for conflict emails: >1 distinct identity signatures
         # This covers: same email with different company, different name, etc.
@@ -379,17 +432,19 @@ def process_job(db: Session, application_id: int, file_key: str):
         for email, sigs in email_to_sigs.items():
             if len(sigs) > 1:
                 conflict_count += 1
-                # Build candidate rows payload (show row snapshots)
-                candidate_rows = []
-                raw_rows = db.query(RawRow).filter(RawRow.id.in_(email_to_row_ids[email])).all()
-                for rr in raw_rows:
-                    candidate_rows.append({
-                        "raw_row_id": rr.id,
-                        "row_number": rr.row_number,
-                        "data": json.loads(rr.data_json),
-                    })
+                # Build candidate rows payload (show row snapshots), in CSV order
+                candidate_rows = [
+                    {
+                        "raw_row_id": row_ids[i],
+                        "row_number": raw_dicts[i]["row_number"],
+                        "data": raw_dicts[i]["data_json"],
+                    }
+                    for i in email_to_indices[email]
+                ]
+
+                issue_rows.append(duplicate_issue_row(application_id=application_id, email=email, candidate_rows=candidate_rows))
 
-                upsert_duplicate_issue(db, application_id=application_id, email=email, candidate_rows=candidate_rows)
+        upsert_issues(db, issue_rows)
 
         # Count total issues (all types)
         total_issue_count = db.query(Issue).filter(Issue.application_id == application_id, Issue.status == IssueStatus.OPEN).count()
@@ -415,48 +470,58 @@ def process_job(db: Session, application_id: int, file_key: str):
         set_job_failed(db, application, f"Processing error: {str(e)}\n{traceback.format_exc()}")
 
 
+def handle_message(m: dict) -> bool:
+    """Process one SQS message; True if it can be deleted from the queue."""
+    try:
+        body = orjson.loads(m["Body"])
+        application_id = int(body["application_id"])
+        file_key = body["file_key"]
+
+        db = SessionLocal()
+        try:
+            process_job(db, application_id, file_key)
+        finally:
+            db.close()
+
+        print(f"Processed application {application_id} successfully.")
+        return True
+    except Exception as e:
+        # Don't delete message -> SQS will retry
+        print("Error processing message:", str(e))
+        traceback.print_exc()
+
+        # Best-effort: mark application failed (if we can)
+        try:
+            db = SessionLocal()
+            try:
+                application_id = int(orjson.loads(m["Body"]).get("application_id", 0))
+                application = db.get(Application, application_id)
+                if application and application.status != ApplicationStatus.COMPLETED:
+                    set_job_failed(db, application, f"{e}\n{traceback.format_exc()}")
+            finally:
+                db.close()
+        except Exception:
+            pass
+        return False
+
+
 def main():
     print("Worker started. Polling SQS...")
+    # One thread per message of a receive batch: the batch is done (and deleted) about as soon
+    # as its slowest job, so messages aren't left waiting behind each other past the visibility timeout
+    pool = ThreadPoolExecutor(max_workers=settings.worker_batch_size)
     while True:
         try:
-            messages, queue_url = poll_messages(max_messages=1, wait_seconds=10)
+            # Long poll: blocks up to 20s when the queue is idle, so no sleep between receives
+            messages, queue_url = poll_messages(max_messages=settings.worker_batch_size, wait_seconds=20)
             if not messages:
                 continue
 
-            for m in messages:
-                receipt = m["ReceiptHandle"]
-                try:
-                    body = json.loads(m["Body"])
-                    application_id = int(body["application_id"])
-                    file_key = body["file_key"]
-
-                    db = SessionLocal()
-                    try:
-                        process_job(db, application_id, file_key)
-                    finally:
-                        db.close()
-
-                    delete_message(queue_url, receipt)
-                    print(f"Processed application {application_id} successfully.")
-                except Exception as e:
-                    # Don't delete message -> SQS will retry
-                    print("Error processing message:", str(e))
-                    traceback.print_exc()
-
-                    # Best-effort: mark application failed (if we can)
-                    try:
-                        db = SessionLocal()
-                        try:
-                            application_id = int(json.loads(m["Body"]).get("application_id", 0))
-                            application = db.get(Application, application_id)
-                            if application and application.status != ApplicationStatus.COMPLETED:
-                                set_job_failed(db, application, f"{e}\n{traceback.format_exc()}")
-                        finally:
-                            db.close()
-                    except Exception:
-                        pass
-
-            time.sleep(0.1)
+            results = pool.map(handle_message, messages)
+            receipts = [m["ReceiptHandle"] for m, ok in zip(messages, results) if ok]
+            failed = delete_message_batch(queue_url, receipts)
+            if failed:
+                print("Failed to delete messages:", failed)
         except Exception as outer:
             print("Worker loop error:", str(outer))
             traceback.print_exc()